@@ -5,24 +5,120 @@
 讀取 Excel 檔案並進行情緒分析
 """
 
-import json
+import re
+import asyncio
+import hashlib
+import sqlite3
+import aiohttp
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import time
 import glob
 import os
 from datetime import datetime
 
+# 有安裝 python-calamine 時改用 Rust 實作的 xlsx 解析器，讀取較快
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # 使用 pandas 預設引擎 (openpyxl)
+
+# 情緒分數對應的標籤
+EMOTION_LABELS = {"1": "正向", "0": "中性", "-1": "負向"}
+
+# 回應中每一行必須恰好是一個情緒分數（允許前後空白與引號）
+SCORE_PATTERN = re.compile(r"\s*['\"]?(-?1|0)['\"]?\s*")
+
+# Gemini 產生內容的參數
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topK": 40,
+    "topP": 0.95,
+    "maxOutputTokens": 8192,
+}
+
+class AdaptiveLimiter:
+    """依 429 回饋調整速率的 token bucket 限流器（遇 429 減半，連續成功後逐步調升）"""
+    
+    def __init__(self, rate: float = 1 / 3, rate_min: float = 1 / 60, rate_max: float = 1.0,
+                 increase_after: int = 10):
+        """
+        初始化限流器
+        
+        Args:
+            rate: 初始速率（每秒請求數）
+            rate_min: 速率下限
+            rate_max: 速率上限
+            increase_after: 連續成功幾次後調升速率
+        """
+        self.rate = rate
+        self.rate_min = rate_min
+        self.rate_max = rate_max
+        self.increase_after = increase_after
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.last_decrease = float('-inf')
+        self.success_streak = 0
+    
+    def _reserve(self) -> float:
+        """補充 token 並預約一個，回傳需等待的秒數"""
+        now = time.monotonic()
+        self.tokens = min(1.0, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        self.tokens -= 1
+        # token 不足時以負值記帳，讓同時等待的請求依序錯開
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+    
+    async def acquire(self) -> None:
+        """非同步取得一個 token，只有 token 不足時才等待"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def wait(self) -> None:
+        """同步版本的 acquire"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def on_rate_limited(self) -> bool:
+        """
+        遇到 429 時將速率減半；同一波壅塞中並行請求各自回報的 429 只算一次
+        
+        Returns:
+            bool: 這次是否實際調降了速率
+        """
+        self.success_streak = 0
+        now = time.monotonic()
+        # 上次減半後未滿一個 token 的間隔，視為同一次壅塞
+        if now - self.last_decrease < 1 / self.rate:
+            return False
+        self.rate = max(self.rate_min, self.rate * 0.5)
+        self.last_decrease = now
+        return True
+    
+    def on_success(self) -> None:
+        """連續成功達門檻時調升速率（每分鐘多 1 次）"""
+        self.success_streak += 1
+        if self.success_streak >= self.increase_after:
+            self.rate = min(self.rate_max, self.rate + 1 / 60)
+            self.success_streak = 0
+
 class EmotionAnalyzer:
     """情緒分析類別"""
     
-    def __init__(self, config_file: str = "api.json"):
+    def __init__(self, config_file: str = "api.json", cache_file: str = "emotion_cache.db"):
         """
         初始化情緒分析器
         
         Args:
             config_file: 設定檔路徑，包含 API 金鑰
+            cache_file: 情緒分析快取資料庫路徑
         """
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
         self.config = self.load_config(config_file)
@@ -32,6 +128,21 @@ class EmotionAnalyzer:
             raise ValueError("API 金鑰未找到，請檢查 api.json 檔案")
         
         self.current_model = "gemini-2.5-flash"  # 預設使用 Flash 模型
+        self.max_concurrency = 16  # 同時送出的最大請求數
+        self.batch_size = 20  # 每個請求合併分析的文本數
+        self.max_invalid_replies = 3  # 批次回應格式連續錯誤幾次後拆半重送
+        self.limiter = AdaptiveLimiter()  # 依 429 回饋自動調整請求速率
+        
+        # 同步請求共用連線池，避免每次重新建立 TCP/TLS 連線（重試由 analyze_emotion 負責）
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0))
+        
+        # 兩種提示詞共用的背景資訊
+        self.background_info = """你所需要知道的資訊：
+1、小詠、大詠是宿舍的名字
+2、學餐是指學生餐廳，最近因為學校政策而關閉
+3、操場最近換了顏色
+"""
         
         # 情緒分析提示詞
         self.emotion_prompt = """你是一個簡單的情緒判斷助理，僅根據整體輸入內容判斷其情緒為正向、中性或負向。  
@@ -42,32 +153,59 @@ class EmotionAnalyzer:
 '1'表示正向，'0'表示中性，'-1'表示負向。
 禁止生成任何其他字符、逐點回應或額外內容。
 
-你所需要知道的資訊：
-1、小詠、大詠是宿舍的名字
-2、學餐是指學生餐廳，最近因為學校政策而關閉
-3、操場最近換了顏色
+""" + self.background_info + """
+請分析以下文本：
+"""
+        
+        # 批次情緒分析提示詞，{count} 為該批文本數量
+        self.batch_prompt = """你是一個簡單的情緒判斷助理，僅根據每則輸入內容判斷其情緒為正向、中性或負向。  
+以下有 {count} 則編號文本，請將每則文本視為一個完整內容，而非逐點或逐句分析。
+判斷時，需有明確正向、負向詞彙才判斷成正負向，否則皆視為中性
 
+請依序輸出 {count} 行，每行只有單一數字：  
+'1'表示正向，'0'表示中性，'-1'表示負向。
+禁止生成任何其他字符、編號、逐點回應或額外內容。
+
+""" + self.background_info + """
 請分析以下文本：
 """
+        
+        # 載入已分析過的結果，相同文本不再重複呼叫 API
+        self.cache_commit_every = 20  # 每寫入幾筆快取就 commit 一次
+        self._cache_pending = 0
+        self.cache_conn = sqlite3.connect(cache_file)
+        self.cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS emotion_cache (hash TEXT PRIMARY KEY, score TEXT)"
+        )
+        self.cache = dict(self.cache_conn.execute("SELECT hash, score FROM emotion_cache"))
+        if self.cache:
+            print(f"從 {cache_file} 載入了 {len(self.cache)} 筆情緒分析快取")
     
     def load_config(self, config_file: str) -> Dict[str, Any]:
         """載入設定檔"""
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(config_file, 'rb') as f:
+                return orjson.loads(f.read())
         except FileNotFoundError:
             print(f"設定檔 {config_file} 未找到")
             return {}
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             print(f"設定檔 {config_file} 格式錯誤")
             return {}
     
-    def send_message(self, message: str) -> Dict[str, Any]:
+    def build_payload(self, message: str) -> bytes:
+        """構建請求內容 - 只支援文字，序列化一次後可在重試時重複使用"""
+        return orjson.dumps({
+            "contents": [{"parts": [{"text": message}]}],
+            "generationConfig": GENERATION_CONFIG,
+        })
+    
+    def send_message(self, payload: bytes) -> Dict[str, Any]:
         """
         發送文字訊息給 Gemini API
         
         Args:
-            message: 要發送的文字訊息
+            payload: 由 build_payload 產生的請求內容
             
         Returns:
             Dict: API 回應
@@ -78,43 +216,140 @@ class EmotionAnalyzer:
             "Content-Type": "application/json"
         }
         
-        # 構建請求內容 - 只支援文字
-        payload = {
-            "contents": [{"parts": [{"text": message}]}],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 8192,
-            }
-        }
-        
         # 添加 API 金鑰到 URL
         url_with_key = f"{url}?key={self.api_key}"
         
         try:
-            response = requests.post(url_with_key, headers=headers, json=payload)
+            response = self.session.post(url_with_key, headers=headers, data=payload, timeout=30)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
             
         except requests.exceptions.RequestException as e:
             return {"error": f"請求錯誤: {e}"}
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
+            return {"error": f"回應解析錯誤: {e}"}
+    
+    async def send_message_async(self, session: aiohttp.ClientSession, payload: bytes) -> Dict[str, Any]:
+        """
+        非同步發送文字訊息給 Gemini API，共用同一個 ClientSession 的連線
+        
+        Args:
+            session: aiohttp 連線物件
+            payload: 由 build_payload 產生的請求內容
+            
+        Returns:
+            Dict: API 回應，格式與 send_message 相同
+        """
+        url = f"{self.base_url}/models/{self.current_model}:generateContent"
+        url_with_key = f"{url}?key={self.api_key}"
+        headers = {"Content-Type": "application/json"}
+        
+        try:
+            async with session.post(url_with_key, headers=headers, data=payload) as response:
+                response.raise_for_status()
+                return orjson.loads(await response.read())
+                
+        except aiohttp.ClientError as e:
+            return {"error": f"請求錯誤: {e}"}
+        except asyncio.TimeoutError:
+            # aiohttp 逾時不屬於 ClientError，同樣回傳錯誤交由 check_response 重試
+            return {"error": "請求錯誤: 請求逾時 (30 秒)"}
+        except orjson.JSONDecodeError as e:
             return {"error": f"回應解析錯誤: {e}"}
     
     def extract_text_from_response(self, response: Dict[str, Any]) -> str:
         """從 API 回應中提取文字內容"""
         try:
-            candidates = response.get("candidates", [])
-            if candidates:
-                content = candidates[0].get("content", {})
-                parts = content.get("parts", [])
-                if parts:
-                    return parts[0].get("text", "無回應內容")
-            return "無有效回應"
+            part = response["candidates"][0]["content"]["parts"][0]
+            return part["text"] if "text" in part else "無回應內容"
         except (KeyError, IndexError):
+            return "無有效回應"
+        except TypeError:
             return "回應格式錯誤"
     
+    def parse_scores(self, result: str, count: int) -> Optional[List[str]]:
+        """
+        逐行解析回應中的情緒分數
+        
+        Args:
+            result: API 回應文字
+            count: 預期的情緒分數數量
+            
+        Returns:
+            Optional[List[str]]: 情緒分數列表；非空白行數不符或任一行不是單一分數時為 None
+        """
+        lines = [line for line in result.splitlines() if line.strip()]
+        if len(lines) != count:
+            return None
+        matches = [SCORE_PATTERN.fullmatch(line) for line in lines]
+        if not all(matches):
+            return None
+        return [match.group(1) for match in matches]
+    
+    def check_response(self, response: Dict[str, Any], retry_count: int,
+                       count: int = 1) -> Tuple[Optional[List[str]], float, bool]:
+        """
+        檢查 API 回應，決定採用結果或重試前需等待的秒數
+        
+        Args:
+            response: API 回應
+            retry_count: 目前的嘗試次數
+            count: 預期的情緒分數數量
+            
+        Returns:
+            Tuple: (情緒分數列表, 等待秒數, 是否為格式不符的回應)，分數為 None 表示需要重試
+        """
+        if "error" in response:
+            if "429" in str(response["error"]):  # 頻率限制錯誤
+                # 由限流器降低速率，重試時自然會等待下一個 token
+                if self.limiter.on_rate_limited():
+                    print(f"遇到頻率限制 (第{retry_count}次重試)，速率降至每分鐘 {self.limiter.rate * 60:.1f} 次")
+                else:
+                    print(f"遇到頻率限制 (第{retry_count}次重試)，維持每分鐘 {self.limiter.rate * 60:.1f} 次")
+                return None, 0, False
+            elif "quota" in str(response["error"]).lower() or "limit" in str(response["error"]).lower():
+                print(f"遇到配額限制 (第{retry_count}次重試)，等待 30 秒後重試...")
+                return None, 30, False
+            else:
+                print(f"API 錯誤 (第{retry_count}次重試): {response['error']}")
+                print("等待 10 秒後重試...")
+                return None, 10, False
+        
+        # 成功獲得回應，處理結果
+        result = self.extract_text_from_response(response)
+        emotion_scores = self.parse_scores(result, count)
+        
+        # 驗證結果是否為有效的情緒分數
+        if emotion_scores is not None:
+            self.limiter.on_success()
+            if retry_count > 1:
+                print(f"重試成功！(共重試 {retry_count-1} 次)")
+            return emotion_scores, 0, False
+        
+        print(f"無效的API回應 (第{retry_count}次重試): {result}")
+        print("等待 5 秒後重試...")
+        return None, 5, True
+    
+    def cache_key(self, text: str) -> str:
+        """以單筆與批次提示詞及文本計算快取鍵，任一提示詞變更時舊結果自動失效"""
+        return hashlib.sha1((self.emotion_prompt + self.batch_prompt + text).encode('utf-8')).hexdigest()
+    
+    def store_cache(self, key: str, emotion_score: str) -> None:
+        """寫入快取，累積一定筆數後 commit"""
+        self.cache[key] = emotion_score
+        self.cache_conn.execute(
+            "INSERT OR REPLACE INTO emotion_cache (hash, score) VALUES (?, ?)", (key, emotion_score)
+        )
+        self._cache_pending += 1
+        if self._cache_pending >= self.cache_commit_every:
+            self.flush_cache()
+    
+    def flush_cache(self) -> None:
+        """將尚未 commit 的快取寫入磁碟"""
+        if self._cache_pending:
+            self.cache_conn.commit()
+            self._cache_pending = 0
+    
     def analyze_emotion(self, text: str) -> str:
         """
         分析單一文本的情緒，遇到錯誤會持續重試直到成功
@@ -125,44 +360,223 @@ class EmotionAnalyzer:
         Returns:
             str: 情緒分數 ('1', '0', '-1')
         """
-        full_message = self.emotion_prompt + text
+        key = self.cache_key(text)
+        if key in self.cache:
+            return self.cache[key]
+        
+        payload = self.build_payload(f"{self.emotion_prompt}{text}")
         retry_count = 0
         
         while True:  # 無限重試直到成功
             retry_count += 1
-            response = self.send_message(full_message)
+            self.limiter.wait()
+            response = self.send_message(payload)
+            emotion_scores, wait_time, _ = self.check_response(response, retry_count)
+            if emotion_scores is not None:
+                self.store_cache(key, emotion_scores[0])
+                self.flush_cache()
+                return emotion_scores[0]
+            if wait_time > 0:
+                time.sleep(wait_time)
+    
+    def build_batch_message(self, texts: List[str]) -> str:
+        """將多則文本組成編號清單，每則文本壓成單行以免與編號混淆"""
+        lines = [f"{i}. {' '.join(text.split())}" for i, text in enumerate(texts, 1)]
+        return self.batch_prompt.format(count=len(texts)) + "\n".join(lines)
+    
+    def analyze_emotion_batch(self, texts: List[str]) -> List[str]:
+        """
+        以單一請求分析多則文本的情緒，快取中已有的文本不重複送出
+        
+        Args:
+            texts: 要分析的文本列表
             
-            if "error" in response:
-                if "429" in str(response["error"]):  # 頻率限制錯誤
-                    wait_time = min(60, 5 * retry_count)  # 最多等待60秒
-                    print(f"遇到頻率限制 (第{retry_count}次重試)，等待 {wait_time} 秒後重試...")
-                    time.sleep(wait_time)
-                    continue
-                elif "quota" in str(response["error"]).lower() or "limit" in str(response["error"]).lower():
-                    print(f"遇到配額限制 (第{retry_count}次重試)，等待 30 秒後重試...")
-                    time.sleep(30)
-                    continue
-                else:
-                    print(f"API 錯誤 (第{retry_count}次重試): {response['error']}")
-                    print("等待 10 秒後重試...")
-                    time.sleep(10)
-                    continue
+        Returns:
+            List[str]: 依序對應每則文本的情緒分數
+        """
+        keys = [self.cache_key(text) for text in texts]
+        missing = [i for i, key in enumerate(keys) if key not in self.cache]
+        
+        try:
+            for start in range(0, len(missing), self.batch_size):
+                self._analyze_chunk([texts[i] for i in missing[start:start + self.batch_size]])
+        finally:
+            # 中斷時也保留已完成的結果
+            self.flush_cache()
+        
+        return [self.cache[key] for key in keys]
+    
+    def _handle_chunk_reply(self, texts: List[str], response: Dict[str, Any], retry_count: int,
+                            invalid_count: int) -> Tuple[Optional[List[str]], Optional[float], int]:
+        """
+        判斷一次批次請求的回應該採用、等待後重試或拆半重送（同步與非同步版本共用）
+        
+        Args:
+            texts: 本批次的文本列表
+            response: API 回應
+            retry_count: 目前的嘗試次數
+            invalid_count: 目前累計的格式不符次數
             
-            # 成功獲得回應，處理結果
-            result = self.extract_text_from_response(response)
-            # 清理結果，只保留數字
-            cleaned_result = result.strip().replace("'", "").replace('"', "")
+        Returns:
+            Tuple: (情緒分數列表, 等待秒數, 更新後的格式不符次數)；
+                   分數不為 None 表示成功並已寫入快取，等待秒數為 None 表示應拆半重送
+        """
+        emotion_scores, wait_time, invalid = self.check_response(response, retry_count, len(texts))
+        if emotion_scores is not None:
+            for text, emotion_score in zip(texts, emotion_scores):
+                self.store_cache(self.cache_key(text), emotion_score)
+            return emotion_scores, 0, invalid_count
+        
+        invalid_count += invalid
+        if invalid_count >= self.max_invalid_replies and len(texts) > 1:
+            half = len(texts) // 2
+            print(f"批次回應格式連續錯誤，拆成 {half} 與 {len(texts) - half} 則重新分析")
+            return None, None, invalid_count
+        return None, wait_time, invalid_count
+    
+    def _analyze_chunk(self, texts: List[str]) -> List[str]:
+        """
+        以單一請求分析一批文本；回應格式連續不符時拆成兩半分別重送
+        
+        Args:
+            texts: 要分析的文本列表（不超過 batch_size 則）
             
-            # 驗證結果是否為有效的情緒分數
-            if cleaned_result in ['1', '0', '-1']:
-                if retry_count > 1:
-                    print(f"重試成功！(共重試 {retry_count-1} 次)")
-                return cleaned_result
+        Returns:
+            List[str]: 依序對應每則文本的情緒分數
+        """
+        payload = self.build_payload(self.build_batch_message(texts))
+        retry_count = 0
+        invalid_count = 0
+        
+        while True:  # 無限重試直到成功
+            retry_count += 1
+            self.limiter.wait()
+            response = self.send_message(payload)
+            emotion_scores, wait_time, invalid_count = self._handle_chunk_reply(
+                texts, response, retry_count, invalid_count)
+            if emotion_scores is not None:
+                return emotion_scores
+            if wait_time is None:
+                break
+            if wait_time > 0:
+                time.sleep(wait_time)
+        
+        half = len(texts) // 2
+        return self._analyze_chunk(texts[:half]) + self._analyze_chunk(texts[half:])
+    
+    async def _analyze_chunk_async(self, session: aiohttp.ClientSession, sem: asyncio.Semaphore,
+                                   texts: List[str]) -> List[str]:
+        """
+        _analyze_chunk 的非同步版本，以 semaphore 限制同時進行的請求數
+        
+        Args:
+            session: aiohttp 連線物件
+            sem: 控制並行數量的 semaphore
+            texts: 要分析的文本列表（不超過 batch_size 則）
+            
+        Returns:
+            List[str]: 依序對應每則文本的情緒分數
+        """
+        payload = self.build_payload(self.build_batch_message(texts))
+        retry_count = 0
+        invalid_count = 0
+        
+        async with sem:
+            while True:  # 無限重試直到成功
+                retry_count += 1
+                await self.limiter.acquire()
+                response = await self.send_message_async(session, payload)
+                emotion_scores, wait_time, invalid_count = self._handle_chunk_reply(
+                    texts, response, retry_count, invalid_count)
+                if emotion_scores is not None:
+                    return emotion_scores
+                if wait_time is None:
+                    break
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+        
+        # 先釋放 semaphore 再拆半重送，避免所有名額都在等待子請求
+        half = len(texts) // 2
+        left, right = await asyncio.gather(
+            self._analyze_chunk_async(session, sem, texts[:half]),
+            self._analyze_chunk_async(session, sem, texts[half:]),
+        )
+        return left + right
+    
+    def save_checkpoint(self, scores: np.ndarray, labels: np.ndarray, checkpoint_file: str) -> None:
+        """只將情緒結果寫入 Parquet 進度檔，避免反覆重寫整份 Excel"""
+        pd.DataFrame({'情緒分析': scores, '情緒標籤': labels}).to_parquet(checkpoint_file, index=False)
+    
+    async def _analyze_batch(self, texts: np.ndarray, indices: List[int], scores: np.ndarray,
+                             labels: np.ndarray, checkpoint_file: str) -> None:
+        """
+        將文本分批合併成請求並行送出，依完成順序將結果寫入結果陣列；相同文本只分析一次
+        
+        Args:
+            texts: 所有列的文本
+            indices: 待分析的列位置
+            scores: 情緒分數結果陣列
+            labels: 情緒標籤結果陣列
+            checkpoint_file: 進度保存的 Parquet 檔案路徑
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        total = len(indices)
+        completed = 0
+        
+        # 依文本分組，重複的文本共用同一個請求
+        groups: Dict[str, List[int]] = {}
+        for idx in indices:
+            groups.setdefault(str(texts[idx]), []).append(idx)
+        
+        def record(text: str, emotion_score: str) -> None:
+            nonlocal completed
+            emotion_label = EMOTION_LABELS[emotion_score]
+            rows = groups[text]
+            scores[rows] = emotion_score
+            labels[rows] = emotion_label
+            
+            last_saved = completed // 5
+            completed += len(rows)
+            duplicate_note = f"（另有 {len(rows) - 1} 筆相同文本）" if len(rows) > 1 else ""
+            print(f"\n[{completed}/{total}] 第 {rows[0]+1} 行{duplicate_note}:")
+            print(f"文本: {text[:100]}{'...' if len(text) > 100 else ''}")
+            print(f"結果: {emotion_label} ({emotion_score})")
+            
+            # 每完成5筆就保存一次（避免意外中斷損失進度）
+            if completed // 5 > last_saved or completed == total:
+                self.save_checkpoint(scores, labels, checkpoint_file)
+                print(f"已保存進度 ({completed}/{total})")
+        
+        # 快取命中的文本直接寫入，其餘每 batch_size 則合併成一個請求
+        missing = []
+        for text in groups:
+            key = self.cache_key(text)
+            if key in self.cache:
+                record(text, self.cache[key])
             else:
-                print(f"無效的API回應 (第{retry_count}次重試): {result}")
-                print("等待 5 秒後重試...")
-                time.sleep(5)
-                continue
+                missing.append(text)
+        chunks = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        
+        # 與 send_message 相同的 30 秒逾時，避免單一卡住的請求拖住整批
+        timeout = aiohttp.ClientTimeout(total=30)
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def analyze_chunk(chunk: List[str]) -> Tuple[List[str], List[str]]:
+                return chunk, await self._analyze_chunk_async(session, sem, chunk)
+            
+            tasks = [asyncio.ensure_future(analyze_chunk(chunk)) for chunk in chunks]
+            
+            try:
+                for future in asyncio.as_completed(tasks):
+                    chunk, emotion_scores = await future
+                    for text, emotion_score in zip(chunk, emotion_scores):
+                        record(text, emotion_score)
+            finally:
+                # 中斷時取消尚未完成的請求
+                for task in tasks:
+                    task.cancel()
+                self.flush_cache()
     
     def process_excel_file(self, input_file: str, output_file: str, text_column: str = None):
         """
@@ -177,101 +591,83 @@ class EmotionAnalyzer:
         
         try:
             # 讀取 Excel 檔案
-            df = pd.read_excel(input_file)
+            df = pd.read_excel(input_file, engine=EXCEL_ENGINE)
             print(f"成功讀取 {len(df)} 筆資料")
             print(f"可用欄位: {df.columns.tolist()}")
             
             # 自動偵測文本欄位
             if text_column is None:
-                text_columns = []
-                for col in df.columns:
-                    if df[col].dtype == 'object':  # 字串類型欄位
-                        # 檢查是否包含文字內容
-                        sample_texts = df[col].dropna().head(3)
-                        if len(sample_texts) > 0:
-                            avg_length = sample_texts.astype(str).str.len().mean()
-                            if avg_length > 5:  # 平均長度大於5的欄位可能是文本
-                                text_columns.append(col)
+                # 一次計算所有字串類型欄位的平均文字長度
+                text_df = df.select_dtypes(include=['object', 'string'])
+                lengths = pd.Series(dtype=float)
+                if len(text_df.columns) > 0:
+                    lengths = text_df.apply(lambda s: s.dropna().astype(str).str.len().mean())
                 
-                if not text_columns:
+                # 平均長度大於5的欄位可能是文本
+                candidates = lengths[lengths > 5]
+                if candidates.empty:
                     raise ValueError("未找到合適的文本欄位")
                 
                 # 選擇最可能的文本欄位（通常是長度最長的）
-                text_column = max(text_columns, key=lambda col: df[col].astype(str).str.len().mean())
+                text_column = candidates.idxmax()
                 print(f"自動選擇文本欄位: {text_column}")
             
             if text_column not in df.columns:
                 raise ValueError(f"指定的欄位 '{text_column}' 不存在")
             
+            # 結果先寫入預先配置的陣列，保存時才整欄寫回 DataFrame
+            total_rows = len(df)
+            scores = np.full(total_rows, "", dtype=object)
+            labels = np.full(total_rows, "", dtype=object)
+            
             # 檢查是否已有部分結果（斷點續傳）
-            start_index = 0
+            checkpoint_file = f"{output_file}.parquet"
             try:
-                existing_df = pd.read_excel(output_file)
-                if '情緒分析' in existing_df.columns and '情緒標籤' in existing_df.columns:
-                    # 找到最後一個已處理的索引
-                    processed_mask = (existing_df['情緒分析'] != '') & (existing_df['情緒標籤'] != '')
+                checkpoint_df = pd.read_parquet(checkpoint_file)
+                if len(checkpoint_df) != len(df):
+                    print("進度檔與輸入檔案筆數不符，將從頭開始處理")
+                else:
+                    processed_mask = (checkpoint_df['情緒分析'] != '') & (checkpoint_df['情緒標籤'] != '')
                     if processed_mask.any():
-                        start_index = processed_mask.sum()
-                        print(f"發現已處理的資料，從第 {start_index + 1} 筆開始繼續...")
-                        df = existing_df.copy()  # 使用已有的資料
+                        print(f"發現已處理的資料 {processed_mask.sum()} 筆，繼續處理其餘資料...")
+                        scores[:] = checkpoint_df['情緒分析'].to_numpy()
+                        labels[:] = checkpoint_df['情緒標籤'].to_numpy()
             except FileNotFoundError:
-                print("輸出檔案不存在，將從頭開始處理")
+                print("進度檔不存在，將從頭開始處理")
             except Exception as e:
-                print(f"讀取已有結果時發生錯誤: {e}，將從頭開始處理")
+                print(f"讀取進度檔時發生錯誤: {e}，將從頭開始處理")
             
-            # 如果是新開始，建立新欄位
-            if start_index == 0:
-                df['情緒分析'] = ""
-                df['情緒標籤'] = ""
+            # 空白文本直接標為中性，其餘未處理的列交給 API 並行分析
+            column = df[text_column]
+            texts = column.to_numpy()
+            empty_mask = (column.isna() | column.astype(str).str.strip().isin(["", "nan"])).to_numpy()
+            unprocessed_mask = scores == ''
+            scores[empty_mask & unprocessed_mask] = "0"
+            labels[empty_mask & unprocessed_mask] = "中性"
+            pending = np.flatnonzero(~empty_mask & unprocessed_mask).tolist()
             
-            # 逐行分析情緒
-            total_rows = len(df)
+            print(f"共 {total_rows} 筆，待分析 {len(pending)} 筆"
+                  f"（每請求 {self.batch_size} 則，最多同時 {self.max_concurrency} 個請求）")
             
             try:
-                for idx in range(start_index, total_rows):
-                    row = df.iloc[idx]
-                    text = str(row[text_column])
-                    
-                    print(f"\n第 {idx+1}/{total_rows} 行:")
-                    print(f"文本: {text[:100]}{'...' if len(text) > 100 else ''}")
-                    
-                    if pd.isna(row[text_column]) or text.strip() == "" or text == "nan":
-                        emotion_score = "0"
-                        emotion_label = "中性"
-                        print("空白文本 -> 中性")
-                    else:
-                        print("分析中...")
-                        emotion_score = self.analyze_emotion(text)
-                        
-                        # 轉換分數為標籤
-                        if emotion_score == "1":
-                            emotion_label = "正向"
-                        elif emotion_score == "-1":
-                            emotion_label = "負向"
-                        else:
-                            emotion_label = "中性"
-                        
-                        print(f"結果: {emotion_label} ({emotion_score})")
-                    
-                    df.at[idx, '情緒分析'] = emotion_score
-                    df.at[idx, '情緒標籤'] = emotion_label
-                    
-                    # 每處理5筆就保存一次（避免意外中斷損失進度）
-                    if (idx + 1) % 5 == 0 or idx == total_rows - 1:
-                        df.to_excel(output_file, index=False)
-                        print(f"已保存進度到第 {idx + 1} 筆")
-                    
-                    # 避免 API 頻率限制
-                    time.sleep(3)  # 增加延遲到3秒
-                    
+                asyncio.run(self._analyze_batch(texts, pending, scores, labels, checkpoint_file))
+                
             except KeyboardInterrupt:
-                print(f"\n\n程式被中斷，已保存進度到第 {idx + 1} 筆")
+                done = (scores != '').sum()
+                print(f"\n\n程式被中斷，已保存進度 ({done}/{total_rows})")
+                self.save_checkpoint(scores, labels, checkpoint_file)
+                df['情緒分析'] = scores
+                df['情緒標籤'] = labels
                 df.to_excel(output_file, index=False)
                 print(f"結果已保存到: {output_file}")
                 return
             
-            # 最終保存
+            # 最終保存，完成後進度檔已無用處
+            df['情緒分析'] = scores
+            df['情緒標籤'] = labels
             df.to_excel(output_file, index=False)
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
             print(f"\n分析完成！結果已儲存到: {output_file}")
             
             # 統計結果
@@ -297,7 +693,7 @@ def generate_statistics_report(result_file: str) -> None:
         print(f"\n正在生成統計報告: {result_file}")
         
         # 讀取 Excel 檔案
-        df = pd.read_excel(result_file)
+        df = pd.read_excel(result_file, engine=EXCEL_ENGINE)
         
         # 檢查是否有情緒分析欄位
         if '情緒標籤' not in df.columns and '情緒分析' not in df.columns:
@@ -361,6 +757,9 @@ def main():
         print("=== 情緒分析程式 ===")
         print("特點:")
         print("- 遇到 API 錯誤會自動重試，直到成功為止")
+        print("- 依頻率限制 (429) 回饋自動調整請求速率")
+        print("- 已分析過的文本會從快取讀取，不重複呼叫 API")
+        print(f"- 每個請求合併 {analyzer.batch_size} 則文本，同時送出最多 {analyzer.max_concurrency} 個請求")
         print("- 每5筆資料自動保存進度")
         print("- 支援斷點續傳，可從中斷處繼續執行")
         print("- 使用 Ctrl+C 可以安全中斷並保存進度")
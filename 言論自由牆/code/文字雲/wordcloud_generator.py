@@ -6,8 +6,10 @@
 """
 
 import pandas as pd
-import jieba
-import matplotlib.pyplot as plt
+try:
+    import jieba_fast as jieba  # Cython 版本的 jieba，API 相同但斷詞較快
+except ImportError:
+    import jieba
 from wordcloud import WordCloud
 import re
 from collections import Counter
@@ -16,40 +18,38 @@ from PIL import Image
 import os
 import glob
 import sys
+from functools import lru_cache
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
-def read_excel_text(file_path):
+# 有安裝 python-calamine 時改用 Rust 實作的 xlsx 解析器，讀取較快
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # 使用 pandas 預設引擎 (openpyxl)
+
+# 非中文、英文、數字的連續字元（含空白），預先編譯供 preprocess_text 使用
+NON_WORD_PATTERN = re.compile(r'[^\u4e00-\u9fff\w]+')
+
+def read_sheet_text(excel_file, sheet_name):
     """
-    讀取 Excel 檔案中的所有文字內容
+    讀取單一工作表中的所有文字內容
     
     Args:
-        file_path (str): Excel 檔案路徑
+        excel_file (pd.ExcelFile): 已開啟的 ExcelFile
+        sheet_name (str): 工作表名稱
     
     Returns:
         str: 合併後的文字內容
     """
-    try:
-        # 讀取 Excel 檔案，嘗試所有工作表
-        excel_file = pd.ExcelFile(file_path)
-        all_text = []
-        
-        print(f"發現 {len(excel_file.sheet_names)} 個工作表: {excel_file.sheet_names}")
-        
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            print(f"處理工作表: {sheet_name} (形狀: {df.shape})")
-            
-            # 將所有文字型態的欄位內容合併
-            for column in df.columns:
-                text_values = df[column].dropna().astype(str)
-                all_text.extend(text_values.tolist())
-        
-        combined_text = ' '.join(all_text)
-        print(f"總共讀取了 {len(combined_text)} 個字符")
-        return combined_text
-        
-    except Exception as e:
-        print(f"讀取 Excel 檔案時發生錯誤: {e}")
-        return ""
+    df = pd.read_excel(excel_file, sheet_name=sheet_name)
+    print(f"處理工作表: {sheet_name} (形狀: {df.shape})")
+    
+    # 將所有欄位一次在 pandas 內合併
+    if df.columns.empty:
+        return ''
+    return pd.concat([series for _, series in df.items()], ignore_index=True).dropna().astype(str).str.cat(sep=' ')
 
 def preprocess_text(text):
     """
@@ -61,11 +61,8 @@ def preprocess_text(text):
     Returns:
         str: 處理後的文字
     """
-    # 移除特殊字符，但保留中文、英文、數字
-    text = re.sub(r'[^\u4e00-\u9fff\w\s]', ' ', text)
-    
-    # 移除多餘的空白
-    text = re.sub(r'\s+', ' ', text)
+    # 移除特殊字符與多餘的空白，但保留中文、英文、數字（單次掃描）
+    text = NON_WORD_PATTERN.sub(' ', text)
     
     # 移除過短的字詞（少於2個字符）
     words = text.split()
@@ -73,25 +70,26 @@ def preprocess_text(text):
     
     return ' '.join(filtered_words)
 
+@lru_cache(maxsize=1)
 def load_stopwords(stopwords_file='stopwords.txt'):
     """
-    從檔案載入停用詞
+    從檔案載入停用詞，結果會被快取，同一檔案只讀取一次
     
     Args:
         stopwords_file (str): 停用詞檔案路徑
     
     Returns:
-        set: 停用詞集合
+        frozenset: 停用詞集合
     """
     stop_words = set()
     
-    # 嘗試從檔案讀取停用詞
+    # 嘗試從檔案讀取停用詞（一次讀入整個檔案）
     try:
-        with open(stopwords_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                word = line.strip()
-                if word and not word.startswith('#'):  # 忽略空行和註解
-                    stop_words.add(word)
+        lines = Path(stopwords_file).read_text(encoding='utf-8').splitlines()
+        stop_words = {
+            word for word in (line.strip() for line in lines)
+            if word and not word.startswith('#')  # 忽略空行和註解
+        }
         print(f"從 {stopwords_file} 載入了 {len(stop_words)} 個停用詞")
     except FileNotFoundError:
         print(f"找不到停用詞檔案 {stopwords_file}，使用內建停用詞")
@@ -161,7 +159,7 @@ def load_stopwords(stopwords_file='stopwords.txt'):
     # 合併檔案中的停用詞和內建停用詞
     stop_words.update(default_stop_words)
     
-    return stop_words
+    return frozenset(stop_words)
 
 def segment_chinese_text(text):
     """
@@ -176,8 +174,9 @@ def segment_chinese_text(text):
     # 使用 jieba 分詞
     words = jieba.lcut(text)
     
-    # 載入停用詞
+    # 載入停用詞（已快取）
     stop_words = load_stopwords()
+    is_digit = str.isdigit
     
     # 過濾停用詞和短詞
     filtered_words = [
@@ -185,42 +184,94 @@ def segment_chinese_text(text):
         if word not in stop_words 
         and len(word) >= 2 
         and word.strip() != ''
-        and not word.isdigit()  # 過濾純數字
+        and not is_digit(word)  # 過濾純數字
     ]
     
     return filtered_words
 
-def create_wordcloud(text, output_path='wordcloud.png'):
+def _init_worker():
+    """子行程初始化：預先載入 jieba 詞典（需為模組層級函式才能在 spawn 模式下傳給子行程）"""
+    jieba.initialize()
+
+def count_words(excel_file, sheet_name):
+    """
+    讀取單一工作表並完成預處理、分詞與詞頻統計
+    
+    Args:
+        excel_file (pd.ExcelFile): 已開啟的 ExcelFile
+        sheet_name (str): 工作表名稱
+    
+    Returns:
+        Counter: 該工作表的詞頻
+    """
+    words = segment_chinese_text(preprocess_text(read_sheet_text(excel_file, sheet_name)))
+    return Counter(words)
+
+def count_sheet_words(args):
+    """
+    在子行程中開啟 Excel 檔案並統計單一工作表的詞頻
+    
+    Args:
+        args (tuple): (Excel 檔案路徑, 工作表名稱)
+    
+    Returns:
+        Counter: 該工作表的詞頻
+    """
+    file_path, sheet_name = args
+    # 用 with 確保檔案在子行程結束前關閉（Windows 下未關閉會鎖住檔案）
+    with pd.ExcelFile(file_path, engine=EXCEL_ENGINE) as excel_file:
+        return count_words(excel_file, sheet_name)
+
+def count_excel_words(file_path):
+    """
+    統計 Excel 檔案所有工作表的詞頻，多個工作表時以多個行程並行處理
+    
+    Args:
+        file_path (str): Excel 檔案路徑
+    
+    Returns:
+        Counter: 合併後的詞頻
+    """
+    try:
+        with pd.ExcelFile(file_path, engine=EXCEL_ENGINE) as excel_file:
+            sheet_names = excel_file.sheet_names
+            print(f"發現 {len(sheet_names)} 個工作表: {sheet_names}")
+            
+            # 只有一個工作表時直接沿用已開啟的檔案處理，省去建立子行程與重複解析的成本
+            if len(sheet_names) == 1:
+                return count_words(excel_file, sheet_names[0])
+        
+        # 斷詞為 CPU 密集工作，使用多行程而非多執行緒
+        workers = min(len(sheet_names), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            counters = list(executor.map(count_sheet_words, [(file_path, name) for name in sheet_names]))
+        return sum(counters, Counter())
+        
+    except Exception as e:
+        print(f"讀取 Excel 檔案時發生錯誤: {e}")
+        return Counter()
+
+def create_wordcloud(word_freq, output_path='wordcloud.png'):
     """
     創建文字雲圖片
     
     Args:
-        text (str): 輸入文字
+        word_freq (Counter): 詞頻統計
         output_path (str): 輸出圖片路徑
     """
-    if not text.strip():
+    if not word_freq:
         print("沒有有效的文字內容可以生成文字雲")
         return
     
-    # 預處理文字
-    processed_text = preprocess_text(text)
-    print(f"預處理後的文字長度: {len(processed_text)}")
-    
-    # 中文分詞
-    words = segment_chinese_text(processed_text)
-    print(f"分詞結果: {len(words)} 個詞語")
+    total_words = sum(word_freq.values())
+    print(f"分詞結果: {total_words} 個詞語")
     
-    if len(words) < 5:
+    if total_words < 5:
         print("詞語數量太少，無法生成有效的文字雲")
         return
     
-    # 統計詞頻
-    word_freq = Counter(words)
     print(f"最常見的10個詞語: {word_freq.most_common(10)}")
     
-    # 將詞語重新組合成字符串
-    text_for_wordcloud = ' '.join(words)
-    
     # 設定文字雲參數
     wordcloud = WordCloud(
         font_path='C:/Windows/Fonts/msjh.ttc',  # 微軟正黑體
@@ -230,24 +281,16 @@ def create_wordcloud(text, output_path='wordcloud.png'):
         max_words=200,
         colormap='viridis',
         relative_scaling=0.5,
-        random_state=42,
-        collocations=False
+        random_state=42
     )
     
     try:
-        # 生成文字雲
-        wordcloud.generate(text_for_wordcloud)
+        # 直接以詞頻生成文字雲，不再重新組字串讓 WordCloud 二次斷詞；
+        # 只傳入實際會繪製的前 max_words 個詞
+        wordcloud.generate_from_frequencies(dict(word_freq.most_common(wordcloud.max_words)))
         
-        # 創建圖表
-        plt.figure(figsize=(19.2, 10.8), dpi=100)
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        plt.tight_layout(pad=0)
-        
-        # 保存圖片
-        plt.savefig(output_path, dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
-        plt.show()
+        # 以生成時的解析度直接保存圖片，不經 matplotlib 重新取樣放大
+        wordcloud.to_file(output_path)
         
         print(f"文字雲已成功保存到: {output_path}")
         
@@ -280,17 +323,18 @@ def main():
     print("文字雲生成器啟動")
     print("="*50)
     
-    # 讀取 Excel 檔案
-    text_content = read_excel_text(excel_file)
+    # 預先載入 jieba 詞典
+    jieba.initialize()
+    
+    # 讀取 Excel 檔案並統計詞頻（各工作表並行處理）
+    word_freq = count_excel_words(excel_file)
     
-    if not text_content:
+    if not word_freq:
         print("無法讀取到有效的文字內容")
         return
     
-    print(f"讀取到的文字內容前100字符: {text_content[:100]}...")
-    
     # 生成文字雲
-    create_wordcloud(text_content, output_file)
+    create_wordcloud(word_freq, output_file)
     
     print("="*50)
     print("程式執行完成")